@@ -16,7 +16,7 @@ Write-Host "Python: $pythonVersion  script: $script outputName: $outputName"
 python -m pip install --upgrade pip
 pip install --upgrade wheel
 # install runtime + build deps
-pip install pyinstaller requests beautifulsoup4 pandas certifi
+pip install pyinstaller requests selectolax orjson certifi
 
 # Clean previous build directories
 if (Test-Path "dist") { Remove-Item -Recurse -Force dist }
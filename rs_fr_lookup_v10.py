@@ -2,27 +2,110 @@
 """
 rs_fr_lookup_v10.py
 
-v10: same logic as v9 but with minimal changes to support:
+v10: looks up RS France part numbers and records brand / manufacturer PN.
  - resource_path() for PyInstaller bundles
  - prefer external input.csv placed next to the EXE at runtime
+ - search page first (embedded JSON, raw snippet scan, card DOM), direct
+   product page only as a fallback
+ - parts looked up in a thread pool behind a shared rate limiter; finished
+   lookups cached in output.cache.json, pages optionally in http_cache/ (RS_CACHE=1)
 
 Output columns: RS_PN, Manufacturer_PN, Brand, Product_URL, Status
 """
-import requests, urllib.parse, time, os, csv, re, sys
+import requests, urllib.parse, time, os, csv, re, sys, email.utils, html, json, string, threading, math, hashlib, queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import chain
+from requests.adapters import HTTPAdapter
 from pathlib import Path
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
+try:
+    import orjson  # optional: faster decoding of the embedded __NEXT_DATA__ blob
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # -------- CONFIG ----------
 INPUT_BASENAME = "input.csv"   # name of the CSV file to look for next to exe
 INPUT_ALTERNATE_DIRS = ["input", "data"]  # optional folders to check
 OUTPUT_FILE = "output.csv"
+OUTPUT_FIELDS = ["RS_PN","Manufacturer_PN","Brand","Product_URL","Status"]
+CACHE_FILE = "output.cache.json"  # successful lookups, reused across runs
 FAILED_DIR = Path("failed_pages"); FAILED_DIR.mkdir(exist_ok=True)
 
+BASE_URL = "https://fr.rs-online.com"
 HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-DELAY = 1.1
-SHORT_DELAY = 0.25
+RATE_LIMIT = 4.0  # requests per second across all workers (sustained)
+RATE_BURST = 8    # requests allowed back-to-back when the bucket is full
 MAX_RETRIES = 3
 RETRY_BACKOFF = 2.0
+MAX_RETRY_AFTER = 120.0  # cap on a server-requested 429 pause (seconds)
+CONCURRENCY = 8   # parts looked up in parallel
+FLUSH_EVERY = 10  # output rows between explicit flushes
+STREAM_CHUNK_SIZE = 8192
+SNIPPET_MARGIN = 800  # chars after a product link the raw snippet scan looks at
+HTTP_CACHE = os.environ.get("RS_CACHE") == "1"  # opt-in: keep fetched pages on disk between runs
+HTTP_CACHE_DIR = Path("http_cache")
+HTTP_CACHE_TTL = 24 * 3600  # seconds a cached page stays valid
+
+# -------- rate limiting ----------
+class RateLimiter:
+    """Token bucket shared by all worker threads."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        # caller holds the lock
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # server pushed back (429): drain the bucket so every worker waits it out
+        with self.lock:
+            # credit the idle time up to now first, or the next acquire() would
+            # count it against the pause
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+LIMITER = RateLimiter(RATE_LIMIT, RATE_BURST)
+
+# one pooled session shared by all workers: keeps TLS connections to fr.rs-online.com alive
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+# max_retries=0: safe_get does its own retry/backoff; pool_maxsize covers every worker thread
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=max(20, CONCURRENCY), max_retries=0))
+
+# -------- precompiled patterns ----------
+_WS_RE = re.compile(r"\s+")
+_SPLIT_RE = re.compile(r"[\s,;/]+")
+_WEBP_RE = re.compile(rb'/web/p/(?:[^"\'\s>\\]+)')  # bytes: scanned on the undecoded page
+_SNIPPET_BRAND_RE = re.compile(r'data-testid=["\']brand-link["\'][^>]*>.*?<span[^>]*>([^<]{1,80})', re.I|re.S)
+_SNIPPET_MPN_DD_RE = re.compile(r'dd[^>]*data-testid=["\']mpn-desktop["\'][^>]*>([^<]{1,80})', re.I|re.S)
+_SNIPPET_MPN_DT_RE = re.compile(r'dt[^>]*data-testid=["\']mpn-desktop["\'][^>]*>[^<]*</dt>\s*<dd[^>]*>([^<]{1,80})', re.I|re.S)
+_SNIPPET_RSPRO_RE = re.compile(r"rs\s*pro", re.I)
+_SNIPPET_DIST_RE = re.compile(r'(\d{2,4}[-]\d{2,4}[-]?\d{0,4})')
+_NEXT_DATA_RE = re.compile(r'<script[^>]*id=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.S)
+
+# character classes for the MPN/brand validators (set lookups beat a regex call on short tokens)
+_ALNUM_SET = frozenset(string.ascii_letters + string.digits)
+_LETTER_SET = frozenset(string.ascii_letters + "".join(map(chr, [*range(0xC0, 0xD7), *range(0xD8, 0xF7), *range(0xF8, 0x100)])))  # [A-Za-zÀ-ÖØ-öø-ÿ]
+_PUNCT_SET = frozenset("-_/.")
 
 # ---------------- resource_path helper ----------------
 def resource_path(relative_path):
@@ -35,298 +118,546 @@ def resource_path(relative_path):
 # -----------------------------------------------------
 
 # -------- Helpers ----------
-def safe_get(url, headers=HEADERS, timeout=15, max_retries=MAX_RETRIES):
+def parse_retry_after(value, default):
+    # Retry-After is either a number of seconds or an HTTP date
+    # the pause stalls every worker, so it is capped at MAX_RETRY_AFTER
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        seconds = when.timestamp() - time.time()
+    if not math.isfinite(seconds):
+        return default
+    return min(max(0.0, seconds), MAX_RETRY_AFTER)
+
+def _http_cache_path(url):
+    return HTTP_CACHE_DIR / (hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html")
+
+def _http_cache_get(url):
+    # a cached page comes back as an already-read 200 Response, so callers
+    # (including the streamed search reader) cannot tell it from a fetched one
+    path = _http_cache_path(url)
+    try:
+        if time.time() - path.stat().st_mtime > HTTP_CACHE_TTL:
+            return None
+        data = path.read_bytes()
+    except OSError:
+        return None
+    r = requests.Response()
+    r.status_code = 200
+    r.url = url
+    r.encoding = "utf-8"
+    r._content = data
+    r._content_consumed = True
+    return r
+
+def _http_cache_put(url, r):
+    try:
+        HTTP_CACHE_DIR.mkdir(exist_ok=True)
+        data = r.content if (r.encoding or "").lower() in ("utf-8", "utf8") else r.text.encode("utf-8")
+        path = _http_cache_path(url)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Unable to cache {url}: {e}")
+
+def safe_get(url, timeout=15, max_retries=MAX_RETRIES, stream=False):
+    if HTTP_CACHE:
+        cached = _http_cache_get(url)
+        if cached is not None:
+            return cached
+        stream = False  # the whole body is needed to store it
     delay = 0.8
     for attempt in range(1, max_retries+1):
+        LIMITER.acquire()
         try:
-            r = requests.get(url, headers=headers, timeout=timeout)
-            return r
+            r = SESSION.get(url, timeout=timeout, stream=stream)
         except Exception as e:
             if attempt == max_retries:
                 raise
             time.sleep(delay)
             delay *= RETRY_BACKOFF
+            continue
+        if r.status_code == 429 and attempt < max_retries:
+            r.close()
+            LIMITER.pause(parse_retry_after(r.headers.get("Retry-After"), delay))
+            delay *= RETRY_BACKOFF
+            continue
+        if HTTP_CACHE and r.status_code == 200:
+            _http_cache_put(url, r)
+        return r
+
+def absolute_url(href):
+    # product links are almost always root-relative ("/web/p/..."): plain
+    # concatenation is enough and much cheaper than urljoin in the per-anchor loops
+    if href.startswith("http"):
+        return href
+    if href.startswith("/") and not href.startswith("//"):
+        return BASE_URL + href
+    return urllib.parse.urljoin(BASE_URL, href)
+
+# failed pages are written by one background thread so workers never block on disk
+_FAILED_Q = queue.Queue()
+
+def _failed_html_writer():
+    while True:
+        fname, html_text = _FAILED_Q.get()
+        try:
+            fname.write_text(html_text, encoding="utf-8")
+        except Exception as e:
+            print(f"Unable to save failed html {fname.name}: {e}")
+        finally:
+            _FAILED_Q.task_done()
+
+threading.Thread(target=_failed_html_writer, name="failed-html-writer", daemon=True).start()
 
 def save_failed_html(rs_pn, html_text, suffix="page"):
-    try:
-        fname = FAILED_DIR / f"{rs_pn}_{suffix}.html"
-        fname.write_text(html_text, encoding="utf-8")
-    except Exception as e:
-        print(f"Unable to save failed html for {rs_pn}: {e}")
+    _FAILED_Q.put((FAILED_DIR / f"{rs_pn}_{suffix}.html", html_text))
 
 def norm(t):
-    return re.sub(r"\s+", " ", (t or "")).strip()
+    return _WS_RE.sub(" ", (t or "")).strip()
 
-# -------- heuristics (unchanged from v9) ----------
+# -------- brand / MPN heuristics (memoised) ----------
 _rejection_substrings = [
     "contains svhc", "cadmium", "lead", "cas no", "ah", " v ", " volt", "volts",
     "amp", "capacity", "rechargeable", "watt", "battery", "description"
 ]
+_REJECT_RE = re.compile("|".join(map(re.escape, _rejection_substrings)))
 
+# the checks below are pure functions of the (stripped) string and see the same
+# brand names / MPNs over and over, so the string-only part is memoised; the
+# per-part RS_PN comparison stays outside the cache
+@lru_cache(maxsize=4096)
 def looks_like_brand(s):
     if not s: return False
     s = s.strip()
-    return bool(re.search(r"[A-Za-zÀ-ÖØ-öø-ÿ]", s)) and len(s) > 1
+    return not _LETTER_SET.isdisjoint(s) and len(s) > 1
 
-def is_valid_mpn_from_field(candidate, rs_pn_hint=None):
+@lru_cache(maxsize=8192)
+def _mpn_field_core(s):
+    if len(s.split()) > 6:
+        return False
+    if _REJECT_RE.search(s.lower()):
+        return False
+    return not _ALNUM_SET.isdisjoint(s)
+
+def is_valid_mpn_from_field(candidate, rs_pn_lower=None):
+    # rs_pn_lower: str(rs_pn).lower(), computed once by the caller
     if not candidate:
         return False
     s = candidate.strip()
-    if len(s.split()) > 6:
+    if not _mpn_field_core(s):
         return False
-    lower = s.lower()
-    for bad in _rejection_substrings:
-        if bad in lower:
-            return False
-    if not re.search(r"[A-Za-z0-9]", s):
-        return False
-    if rs_pn_hint and s.replace(" ", "").lower() == str(rs_pn_hint).lower():
+    if rs_pn_lower and s.replace(" ", "").lower() == rs_pn_lower:
         return False
     return True
 
-def heuristic_mpn_candidate(tok, rs_pn_hint=None):
-    if not tok: return False
-    s = tok.strip()
-    if len(s.split()) > 4:
-        return False
+@lru_cache(maxsize=8192)
+def _mpn_token_core(s):
+    # -> (acceptable, purely numeric)
     if ":" in s:
-        return False
-    if not re.search(r"[A-Za-z0-9]", s):
-        return False
-    if re.fullmatch(r"\d{2,20}", s):
-        if rs_pn_hint and s == str(rs_pn_hint):
-            return False
-        return True
-    has_letter = bool(re.search(r"[A-Za-zÀ-ÖØ-öø-ÿ]", s))
-    has_digit = bool(re.search(r"\d", s))
-    has_punct = bool(re.search(r"[-_\/\.]", s))
+        return False, False
+    if len(s.split()) > 4:
+        return False, False
+    if _ALNUM_SET.isdisjoint(s):
+        return False, False
+    if 2 <= len(s) <= 20 and s.isdecimal():   # same as fullmatch(r"\d{2,20}")
+        return True, True
+    has_letter = not _LETTER_SET.isdisjoint(s)
+    has_digit = any(c.isdecimal() for c in s)   # same as \d on str patterns
+    has_punct = not _PUNCT_SET.isdisjoint(s)
     if (has_letter and has_digit) or (has_punct and (has_letter or has_digit)):
-        return True
+        return True, False
     if has_letter and len(s) >= 3 and len(s.split())==1:
-        return True
-    return False
+        return True, False
+    return False, False
+
+def heuristic_mpn_candidate(tok, rs_pn_lower=None):
+    if not tok: return False
+    s = tok.strip()
+    ok, numeric = _mpn_token_core(s)
+    if numeric and rs_pn_lower and s == rs_pn_lower:
+        return False
+    return ok
+
+# -------- lexbor node helpers ----------
+def find_next_sibling(node, tag=None):
+    nxt = node.next
+    while nxt is not None:
+        if nxt.is_element_node and (tag is None or nxt.tag == tag):
+            return nxt
+        nxt = nxt.next
+    return None
+
+def node_text(node):
+    # normalised text of a node, "" for a missing node; read once and reuse
+    return norm(node.text(separator=" ", strip=True)) if node is not None else ""
+
+def brand_text(node):
+    # brand links/fields wrap the name in a <span> next to icons
+    if node is None:
+        return ""
+    span = node.css_first("span")
+    return norm(span.text(strip=True) if span else node.text(separator=" ", strip=True))
 
-# -------- distrelec extractor helper (unchanged) ----------
+def find_dt_containing(container, label):
+    for dt in container.css("dt"):
+        if label in dt.text(separator=" ", strip=True).lower():
+            return dt
+    return None
+
+# -------- distrelec extractor helper ----------
 def extract_distrelec_from_container(container):
     if not container:
         return ""
-    dd = container.find("dd", {"data-testid": "distrelec-desktop"})
-    if dd and dd.get_text(strip=True):
-        return norm(dd.get_text(" ", strip=True))
-    dt = container.find("dt", {"data-testid": "distrelec-desktop"})
+    text = node_text(container.css_first('dd[data-testid="distrelec-desktop"]'))
+    if text:
+        return text
+    dt = container.css_first('dt[data-testid="distrelec-desktop"]')
     if dt:
-        nxt = dt.find_next_sibling("dd")
-        if nxt and nxt.get_text(strip=True):
-            return norm(nxt.get_text(" ", strip=True))
-    for dt in container.find_all("dt"):
-        if "distrelec" in dt.get_text(" ", strip=True).lower():
-            nxt = dt.find_next_sibling("dd")
-            if nxt and nxt.get_text(strip=True):
-                return norm(nxt.get_text(" ", strip=True))
+        text = node_text(find_next_sibling(dt, "dd"))
+        if text:
+            return text
+    for dt in container.css("dt"):
+        if "distrelec" in dt.text(separator=" ", strip=True).lower():
+            text = node_text(find_next_sibling(dt, "dd"))
+            if text:
+                return text
     return ""
 
-# -------- parse card on search page (unchanged logic) ----------
+# -------- card field extraction (shared by card/sibling lookups) ----------
+def extract_card_fields(node, rs_pn_lower, dt_fallback=True):
+    brand = brand_text(node.css_first('a[data-testid="brand-link"]'))
+    mpn = ""
+    candidate = node_text(node.css_first('dd[data-testid="mpn-desktop"]'))
+    if candidate:
+        if is_valid_mpn_from_field(candidate, rs_pn_lower=rs_pn_lower):
+            mpn = candidate
+    elif dt_fallback:
+        dtmpn = node.css_first('dt[data-testid="mpn-desktop"]') or find_dt_containing(node, "référence fabricant")
+        if dtmpn:
+            candidate = node_text(find_next_sibling(dtmpn, "dd"))
+            if candidate and is_valid_mpn_from_field(candidate, rs_pn_lower=rs_pn_lower):
+                mpn = candidate
+    if (not mpn) and brand and "rs" in brand.lower() and "pro" in brand.lower():
+        dist = extract_distrelec_from_container(node)
+        if dist and is_valid_mpn_from_field(dist, rs_pn_lower=rs_pn_lower):
+            mpn = dist
+    if mpn and not is_valid_mpn_from_field(mpn, rs_pn_lower=rs_pn_lower):
+        for tok in _SPLIT_RE.split(mpn):
+            if heuristic_mpn_candidate(tok, rs_pn_lower=rs_pn_lower):
+                mpn = tok; break
+        else:
+            mpn = ""
+    return brand, mpn
+
+# -------- embedded Next.js data (structured brand/mpn, no DOM needed) ----------
+_JSON_PN_KEYS = ("stockNumber", "stockNo", "rsStockNumber", "articleNumber")
+_JSON_MPN_KEYS = ("mpn", "manufacturerPartNumber", "manufacturerPartNo")
+_JSON_BRAND_KEYS = ("brand", "brandName", "manufacturer")
+_JSON_URL_KEYS = ("url", "productUrl", "href", "path")
+
+def _json_str(value):
+    # brand objects look like {"name": "..."}; everything else is used as-is
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("title") or ""
+    return norm(str(value)) if isinstance(value, (str, int)) else ""
+
+def parse_next_data_for_fields(page_html, rs_pn):
+    """
+    Look for the product record of rs_pn in the page's __NEXT_DATA__ JSON and
+    return (product_url, brand, mpn), or None when the blob or record is missing.
+    product_url is "" when the record carries no product link.
+    The schema is not documented, so any dict carrying the stock number under
+    one of _JSON_PN_KEYS is accepted as the product record.
+    """
+    if "__NEXT_DATA__" not in page_html:
+        return None
+    m = _NEXT_DATA_RE.search(page_html)
+    if not m:
+        return None
+    try:
+        data = _json_loads(m.group(1))
+    except ValueError:
+        return None
+    want = str(rs_pn).replace("-", "").replace(" ", "")
+    rs_pn_lower = str(rs_pn).lower()
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+            continue
+        if not isinstance(node, dict):
+            continue
+        if any(_json_str(node.get(k)).replace("-", "").replace(" ", "") == want for k in _JSON_PN_KEYS if k in node):
+            brand = next((_json_str(node[k]) for k in _JSON_BRAND_KEYS if node.get(k)), "")
+            mpn = next((_json_str(node[k]) for k in _JSON_MPN_KEYS if node.get(k)), "")
+            if brand and not looks_like_brand(brand):
+                brand = ""
+            if mpn and not is_valid_mpn_from_field(mpn, rs_pn_lower=rs_pn_lower):
+                mpn = ""
+            if brand or mpn:
+                url = next((node[k] for k in _JSON_URL_KEYS if isinstance(node.get(k), str) and "/web/p/" in node[k]), "")
+                return (absolute_url(url) if url else ""), brand, mpn
+        stack.extend(reversed(list(node.values())))
+    return None
+
+# -------- parse card on search page (lexbor DOM) ----------
 def parse_search_page_for_fields(search_html, rs_pn):
-    soup = BeautifulSoup(search_html, "html.parser")
-    anchors = soup.find_all("a", href=True)
-    candidates = []
-    for a in anchors:
-        href = a["href"]
-        if "/web/p/" in href:
-            full = href if href.startswith("http") else urllib.parse.urljoin("https://fr.rs-online.com", href)
-            score = 1 + (10 if str(rs_pn) in href or str(rs_pn) in a.get_text(" ", strip=True) else 0)
-            candidates.append((score, a, full))
-    if not candidates:
+    # structured data first: Next.js pages embed the search results as JSON
+    found = parse_next_data_for_fields(search_html, rs_pn)
+    json_url, json_brand, json_mpn = found or ("", "", "")
+    json_link = json_url or f"{BASE_URL}/web/p/{rs_pn}/"   # record without a link of its own
+    if json_brand and json_mpn:
+        return json_link, json_brand, json_mpn, "OK(search-json)"
+    # a partial JSON record does not stop the DOM walk: the card may carry the
+    # missing field, and JSON only fills in what the card lacks
+    # cheap substring prefilter: no product link anywhere means nothing to parse
+    if "/web/p/" not in search_html:
+        if found:
+            return json_link, json_brand, json_mpn, "OK(search-json)"
+        return None, "", "", "SEARCH_NO_PRODUCT_LINK"
+    rs_pn_str = str(rs_pn)
+    rs_pn_lower = rs_pn_str.lower()
+    tree = LexborHTMLParser(search_html)
+    # the score is only ever 11 (link/text mentions the RS PN) or 1, so split
+    # into two buckets in document order instead of sorting
+    exact, others = [], []
+    for a in tree.css('a[href*="/web/p/"]'):
+        href = a.attributes.get("href") or ""
+        if rs_pn_str in href or rs_pn_str in a.text(separator=" ", strip=True):
+            exact.append((a, href))
+        else:
+            others.append((a, href))
+    if not exact and not others:
+        if found:
+            return json_link, json_brand, json_mpn, "OK(search-json)"
         return None, "", "", "SEARCH_NO_PRODUCT_LINK"
-    candidates.sort(key=lambda x: x[0], reverse=True)
 
-    for _, anchor, product_url in candidates:
+    # containers already extracted without a usable result; several anchors
+    # (image, title, "details" link) usually share the same card
+    rejected = set()
+    for anchor, href in chain(exact, others):
+        product_url = absolute_url(href)
         container = anchor
         for _ in range(4):
             if container is None: break
-            if container.name in ("article","li","div"):
-                brand = ""
-                brand_a = container.find("a", {"data-testid": "brand-link"})
-                if brand_a:
-                    span = brand_a.find("span")
-                    brand = norm(span.get_text(strip=True) if span else brand_a.get_text(" ", strip=True))
-                mpn = ""
-                ddmpn = container.find("dd", {"data-testid": "mpn-desktop"})
-                if ddmpn and ddmpn.get_text(strip=True):
-                    candidate = norm(ddmpn.get_text(" ", strip=True))
-                    if is_valid_mpn_from_field(candidate, rs_pn_hint=rs_pn):
-                        mpn = candidate
-                else:
-                    dtmpn = container.find("dt", {"data-testid": "mpn-desktop"}) or container.find(lambda t: t.name=="dt" and "référence fabricant" in t.get_text(" ", strip=True).lower())
-                    if dtmpn:
-                        nxt = dtmpn.find_next_sibling("dd")
-                        if nxt and nxt.get_text(strip=True):
-                            candidate = norm(nxt.get_text(" ", strip=True))
-                            if is_valid_mpn_from_field(candidate, rs_pn_hint=rs_pn):
-                                mpn = candidate
-                if (not mpn) and brand and "rs" in brand.lower() and "pro" in brand.lower():
-                    dist = extract_distrelec_from_container(container)
-                    if dist and is_valid_mpn_from_field(dist, rs_pn_hint=rs_pn):
-                        mpn = dist
-                if mpn and not is_valid_mpn_from_field(mpn, rs_pn_hint=rs_pn):
-                    for tok in re.split(r"[\s,;/]+", mpn):
-                        if heuristic_mpn_candidate(tok, rs_pn_hint=rs_pn):
-                            mpn = tok; break
-                    else:
-                        mpn = ""
-                if (brand and looks_like_brand(brand)) or (mpn and (is_valid_mpn_from_field(mpn, rs_pn) or heuristic_mpn_candidate(mpn, rs_pn))):
-                    return product_url, brand or "", mpn or "", "OK(search-card)"
+            if container.tag in ("article","li","div") and container.mem_id not in rejected:
+                brand, mpn = extract_card_fields(container, rs_pn_lower)
+                if (brand and looks_like_brand(brand)) or (mpn and (is_valid_mpn_from_field(mpn, rs_pn_lower) or heuristic_mpn_candidate(mpn, rs_pn_lower))):
+                    return product_url, brand or json_brand, mpn or json_mpn, "OK(search-card)"
+                rejected.add(container.mem_id)
             container = container.parent
 
-        sibling = anchor.find_next_sibling()
+        sibling = find_next_sibling(anchor)
         if sibling:
-            brand = ""
-            brand_a = sibling.find("a", {"data-testid": "brand-link"})
-            if brand_a:
-                span = brand_a.find("span")
-                brand = norm(span.get_text(strip=True) if span else brand_a.get_text(" ", strip=True))
-            mpn = ""
-            ddmpn = sibling.find("dd", {"data-testid": "mpn-desktop"})
-            if ddmpn and ddmpn.get_text(strip=True):
-                candidate = norm(ddmpn.get_text(" ", strip=True))
-                if is_valid_mpn_from_field(candidate, rs_pn_hint=rs_pn):
-                    mpn = candidate
-            if (not mpn) and brand and "rs" in brand.lower() and "pro" in brand.lower():
-                dist = extract_distrelec_from_container(sibling)
-                if dist and is_valid_mpn_from_field(dist, rs_pn_hint=rs_pn):
-                    mpn = dist
-            if mpn and not is_valid_mpn_from_field(mpn, rs_pn_hint=rs_pn):
-                for tok in re.split(r"[\s,;/]+", mpn):
-                    if heuristic_mpn_candidate(tok, rs_pn_hint=rs_pn):
-                        mpn = tok; break
-                else:
-                    mpn = ""
-            if (brand and looks_like_brand(brand)) or (mpn and (is_valid_mpn_from_field(mpn, rs_pn) or heuristic_mpn_candidate(mpn, rs_pn))):
-                return product_url, brand or "", mpn or "", "OK(search-sibling)"
-    return candidates[0][2], "", "", "OK_FOUND_anchor_no_card_fields"
-
-# -------- aggressive raw scan (unchanged) ----------
-def aggressive_search_scan(search_html, rs_pn):
-    raw = search_html
-    matches = re.findall(r'(/web/p/(?:[^"\'\s>\\]+))', raw)
+            brand, mpn = extract_card_fields(sibling, rs_pn_lower, dt_fallback=False)
+            if (brand and looks_like_brand(brand)) or (mpn and (is_valid_mpn_from_field(mpn, rs_pn_lower) or heuristic_mpn_candidate(mpn, rs_pn_lower))):
+                return product_url, brand or json_brand, mpn or json_mpn, "OK(search-sibling)"
+    first_url = absolute_url((exact or others)[0][1])
+    if found:
+        return json_url or first_url, json_brand, json_mpn, "OK(search-json)"
+    return first_url, "", "", "OK_FOUND_anchor_no_card_fields"
+
+# -------- aggressive raw scan (on response bytes, optional strict window) ----------
+def aggressive_search_scan(page_bytes, rs_pn, strict=False, encoding="utf-8"):
+    # works on the raw response bytes; only the snippet around a hit is decoded.
+    # strict: the snippet starts at the matched link and stops at the next link
+    # to another product, so it cannot pick up a neighbouring card's fields
+    raw = page_bytes
+    pn = str(rs_pn).encode(encoding, "replace")
+    rs_pn_lower = str(rs_pn).lower()
+    matches = _WEBP_RE.findall(raw)
     if matches:
-        for m in matches:
-            if str(rs_pn) in m:
-                link = urllib.parse.urljoin("https://fr.rs-online.com", m)
+        for i, m in enumerate(matches):
+            if pn in m:
+                link = BASE_URL + m.decode(encoding, "replace")
                 idx = raw.find(m)
-                left = max(0, idx-800); right = min(len(raw), idx+800)
-                snippet = raw[left:right]
+                left = max(0, idx-SNIPPET_MARGIN); right = min(len(raw), idx+SNIPPET_MARGIN)
+                if strict:
+                    left = idx
+                    nxt = next((o for o in matches[i+1:] if pn not in o), None)
+                    if nxt:
+                        right = min(right, max(raw.find(nxt, idx), idx))
+                snippet = raw[left:right].decode(encoding, "replace")
+                # three independent searches: one alternation would let a match
+                # consume text another pattern needs (e.g. the dt/dd pair eating
+                # the mpn <dd>, or a span-less brand link swallowing it)
                 brand = ""
-                mbrand = re.search(r'data-testid=["\']brand-link["\'][^>]*>.*?<span[^>]*>([^<]{1,80})', snippet, flags=re.I|re.S)
-                if mbrand: brand = mbrand.group(1).strip()
+                mbrand = _SNIPPET_BRAND_RE.search(snippet)
+                if mbrand: brand = norm(html.unescape(mbrand.group(1)))
                 mpn = ""
-                mmpn = re.search(r'dd[^>]*data-testid=["\']mpn-desktop["\'][^>]*>([^<]{1,80})', snippet, flags=re.I|re.S)
+                mmpn = _SNIPPET_MPN_DD_RE.search(snippet)
                 if not mmpn:
-                    mmpn = re.search(r'dt[^>]*data-testid=["\']mpn-desktop["\'][^>]*>[^<]*</dt>\s*<dd[^>]*>([^<]{1,80})', snippet, flags=re.I|re.S)
+                    mmpn = _SNIPPET_MPN_DT_RE.search(snippet)
                 if mmpn:
-                    cand = mmpn.group(1).strip()
-                    if is_valid_mpn_from_field(cand, rs_pn_hint=rs_pn):
+                    cand = norm(html.unescape(mmpn.group(1)))
+                    if is_valid_mpn_from_field(cand, rs_pn_lower=rs_pn_lower):
                         mpn = cand
                     else:
-                        for tok in re.split(r"[\s,;/]+", cand):
-                            if heuristic_mpn_candidate(tok, rs_pn_hint=rs_pn):
+                        for tok in _SPLIT_RE.split(cand):
+                            if heuristic_mpn_candidate(tok, rs_pn_lower=rs_pn_lower):
                                 mpn = tok; break
-                if (not mpn) and (brand and "rs" in brand.lower() and "pro" in brand.lower() or re.search(r"rs\s*pro", snippet, flags=re.I)):
-                    m_dist = re.search(r'(\d{2,4}[-]\d{2,4}[-]?\d{0,4})', snippet)
+                if (not mpn) and (brand and "rs" in brand.lower() and "pro" in brand.lower() or _SNIPPET_RSPRO_RE.search(snippet)):
+                    m_dist = _SNIPPET_DIST_RE.search(snippet)
                     if m_dist:
                         cand = m_dist.group(1).strip()
-                        if is_valid_mpn_from_field(cand, rs_pn_hint=rs_pn):
+                        if is_valid_mpn_from_field(cand, rs_pn_lower=rs_pn_lower):
                             mpn = cand
                 if brand or mpn:
                     return link, brand, mpn, "OK(raw-snippet)"
-        return urllib.parse.urljoin("https://fr.rs-online.com", matches[0]), "", "", "OK(raw-first)"
+        return BASE_URL + matches[0].decode(encoding, "replace"), "", "", "OK(raw-first)"
     return None, "", "", "NO_RAW_LINKS"
 
-# -------- product page parse (unchanged) ----------
+# -------- product page parse ----------
+_PRODUCT_PAGE_MARKERS = ("brand-link", "brand-desktop", "mpn-desktop")
+
 def parse_product_page_for_fields(html_text, rs_pn_hint=None):
-    soup = BeautifulSoup(html_text, "html.parser")
-    brand = ""
-    a_brand = soup.find("a", {"data-testid": "brand-link"})
-    if a_brand and a_brand.get_text(strip=True):
-        span = a_brand.find("span"); brand = norm(span.get_text(strip=True) if span else a_brand.get_text(" ", strip=True))
+    # skip the parse when none of the fields the lookups below rely on can be present
+    if not any(marker in html_text for marker in _PRODUCT_PAGE_MARKERS) and "fabricant" not in html_text.lower():
+        return "", ""
+    rs_pn_lower = str(rs_pn_hint).lower() if rs_pn_hint else None
+    tree = LexborHTMLParser(html_text)
+    brand = brand_text(tree.css_first('a[data-testid="brand-link"]'))
     if not brand:
-        dd_brand = soup.find("dd", {"data-testid": "brand-desktop"})
-        if dd_brand:
-            sp = dd_brand.find("span"); brand = norm(sp.get_text(strip=True) if sp else dd_brand.get_text(" ", strip=True))
+        brand = brand_text(tree.css_first('dd[data-testid="brand-desktop"]'))
     mpn = ""
-    ddmpn = soup.find("dd", {"data-testid": "mpn-desktop"})
-    if ddmpn and ddmpn.get_text(strip=True):
-        candidate = norm(ddmpn.get_text(" ", strip=True))
-        if is_valid_mpn_from_field(candidate, rs_pn_hint=rs_pn_hint):
+    candidate = node_text(tree.css_first('dd[data-testid="mpn-desktop"]'))
+    if candidate:
+        if is_valid_mpn_from_field(candidate, rs_pn_lower=rs_pn_lower):
             mpn = candidate
         else:
             if candidate.isdigit() and (not rs_pn_hint or candidate != str(rs_pn_hint)):
                 mpn = candidate
     else:
-        dtmpn = soup.find("dt", {"data-testid": "mpn-desktop"}) or soup.find(lambda t: t.name=="dt" and "référence fabricant" in t.get_text(" ", strip=True).lower())
+        dtmpn = tree.css_first('dt[data-testid="mpn-desktop"]') or find_dt_containing(tree, "référence fabricant")
         if dtmpn:
-            nxt = dtmpn.find_next_sibling("dd")
-            if nxt and nxt.get_text(strip=True):
-                candidate = norm(nxt.get_text(" ", strip=True))
-                if is_valid_mpn_from_field(candidate, rs_pn_hint=rs_pn_hint):
+            candidate = node_text(find_next_sibling(dtmpn, "dd"))
+            if candidate:
+                if is_valid_mpn_from_field(candidate, rs_pn_lower=rs_pn_lower):
                     mpn = candidate
                 else:
                     if candidate.isdigit() and (not rs_pn_hint or candidate != str(rs_pn_hint)):
                         mpn = candidate
     if (not mpn) and brand and "rs" in brand.lower() and "pro" in brand.lower():
-        dist = extract_distrelec_from_container(soup)
-        if dist and is_valid_mpn_from_field(dist, rs_pn_hint=rs_pn_hint):
+        dist = extract_distrelec_from_container(tree)
+        if dist and is_valid_mpn_from_field(dist, rs_pn_lower=rs_pn_lower):
             mpn = dist
     return mpn or "", brand or ""
 
-# -------- combined search wrapper (unchanged) ----------
+# -------- streamed search page reader ----------
+def read_until_part_link(chunks, rs_pn):
+    """
+    Consume byte chunks until the first /web/p/ link containing rs_pn and
+    SNIPPET_MARGIN bytes after it are buffered. Returns (data, link_path);
+    link_path is None when the stream ended without such a link.
+    """
+    data = bytearray()   # grows in place; converted to bytes once on return
+    pn = str(rs_pn).encode()
+    scan_from = 0
+    link = None
+    for chunk in chunks:
+        data += chunk
+        if link is None:
+            for m in _WEBP_RE.finditer(data, scan_from):
+                if pn in m.group(0):
+                    link, link_end = bytes(m.group(0)), m.end()
+                    break
+            else:
+                # a link may be cut at the chunk boundary: rescan its tail next time
+                scan_from = max(0, len(data) - 256)
+        if link is not None and len(data) >= link_end + SNIPPET_MARGIN:
+            return bytes(data), link
+    return bytes(data), None
+
+# -------- combined search wrapper (streams the page, stops early when it can) ----------
 def search_rs_for_part_combined(rs_pn):
-    base_search = "https://fr.rs-online.com/web/c/?searchTerm="
+    base_search = BASE_URL + "/web/c/?searchTerm="
     url = base_search + urllib.parse.quote_plus(str(rs_pn))
     try:
-        r = safe_get(url)
+        r = safe_get(url, stream=True)
     except Exception as e:
         return None, "", "", f"SEARCH_ERROR:{e}"
-    if r.status_code != 200:
-        save_failed_html(rs_pn, r.text, suffix="search_http_"+str(r.status_code))
-        return None, "", "", f"SEARCH_HTTP_{r.status_code}"
-    product_link, brand, mpn, status = parse_search_page_for_fields(r.text, rs_pn)
+    try:
+        with r:
+            if r.status_code != 200:
+                save_failed_html(rs_pn, r.text, suffix="search_http_"+str(r.status_code))
+                return None, "", "", f"SEARCH_HTTP_{r.status_code}"
+            encoding = r.encoding or "utf-8"
+            # regex-first: the raw snippet scan only looks at the bytes right after the
+            # matching link, so try it as soon as that part of the page has arrived and
+            # skip decoding the page and building the DOM when it has both fields
+            chunks = r.iter_content(STREAM_CHUNK_SIZE)
+            page_bytes, first_link = read_until_part_link(chunks, rs_pn)
+            if first_link:
+                pl2, b2, m2, st2 = aggressive_search_scan(page_bytes, rs_pn, strict=True, encoding=encoding)
+                if pl2 and b2 and m2 and pl2.endswith(first_link.decode(encoding, "replace")):
+                    # discard the unread remainder so the connection goes back to the pool
+                    if r.raw is not None:   # None for a page served from the HTTP cache
+                        r.raw.drain_conn()
+                    return pl2, b2, m2, st2
+            page_bytes += b"".join(chunks)
+    except requests.RequestException as e:
+        # the body is read here, outside safe_get's retries: report a broken
+        # transfer like a failed request so the caller can still fall back
+        return None, "", "", f"SEARCH_ERROR:{e}"
+    pl2, b2, m2, st2 = aggressive_search_scan(page_bytes, rs_pn, strict=True, encoding=encoding)
+    if pl2 and b2 and m2:
+        return pl2, b2, m2, st2
+    search_html = page_bytes.decode(encoding, "replace")
+    product_link, brand, mpn, status = parse_search_page_for_fields(search_html, rs_pn)
     if product_link and (brand or mpn):
         return product_link, brand, mpn, status
-    pl2, b2, m2, st2 = aggressive_search_scan(r.text, rs_pn)
+    pl2, b2, m2, st2 = aggressive_search_scan(page_bytes, rs_pn, encoding=encoding)
     if pl2:
-        if b2 or m2:
-            return pl2, b2, m2, st2
-        return pl2, "", "", st2
-    save_failed_html(rs_pn, r.text, suffix="search_no_link_raw")
+        return pl2, b2, m2, st2
+    save_failed_html(rs_pn, search_html, suffix="search_no_link_raw")
     return None, "", "", "SEARCH_NO_PRODUCT_LINK"
 
-# -------- main flow (unchanged) ----------
+# -------- main flow (search first, direct product page as fallback) ----------
 def fetch_rs_info(rs_pn):
-    direct_url = f"https://fr.rs-online.com/web/p/{rs_pn}/"
+    rs_pn_lower = str(rs_pn).lower()
+    # search first: the card usually carries both fields, so the direct page is only a fallback
+    product_link, brand_s, mpn_s, status = search_rs_for_part_combined(rs_pn)
+    search_ok = False
+    mpn_clean = ""
+    if (brand_s and looks_like_brand(brand_s)) or (mpn_s and (is_valid_mpn_from_field(mpn_s, rs_pn_lower) or heuristic_mpn_candidate(mpn_s, rs_pn_lower))):
+        search_ok = True
+        mpn_clean = mpn_s
+        if mpn_clean and not is_valid_mpn_from_field(mpn_clean, rs_pn_lower):
+            for tok in _SPLIT_RE.split(mpn_clean):
+                if heuristic_mpn_candidate(tok, rs_pn_lower):
+                    mpn_clean = tok; break
+            else:
+                mpn_clean = ""
+        if mpn_clean and brand_s and looks_like_brand(brand_s):
+            return mpn_clean, brand_s, product_link, f"OK(search:{status})"
+    direct_url = f"{BASE_URL}/web/p/{rs_pn}/"
     try:
         r = safe_get(direct_url)
     except Exception as e:
-        return "", "", "", f"ERROR_DIRECT:{e}"
+        if search_ok:
+            return mpn_clean or "", brand_s or "", product_link, f"OK(search:{status})"
+        return "", "", product_link or "", f"ERROR_DIRECT:{e}"
     if r.status_code == 200:
         mpn, brand = parse_product_page_for_fields(r.text, rs_pn_hint=rs_pn)
-        if (mpn and (is_valid_mpn_from_field(mpn, rs_pn) or heuristic_mpn_candidate(mpn, rs_pn))) or (brand and looks_like_brand(brand)):
+        if (mpn and (is_valid_mpn_from_field(mpn, rs_pn_lower) or heuristic_mpn_candidate(mpn, rs_pn_lower))) or (brand and looks_like_brand(brand)):
             return mpn or "", brand or "", direct_url, "OK(direct)"
         else:
             save_failed_html(rs_pn, r.text, suffix="direct_fields_missing")
-    time.sleep(SHORT_DELAY)
-    product_link, brand_s, mpn_s, status = search_rs_for_part_combined(rs_pn)
+    if search_ok:
+        return mpn_clean or "", brand_s or "", product_link, f"OK(search:{status})"
     if not product_link:
         return "", "", "", status
-    if (brand_s and looks_like_brand(brand_s)) or (mpn_s and (is_valid_mpn_from_field(mpn_s, rs_pn) or heuristic_mpn_candidate(mpn_s, rs_pn))):
-        mpn_clean = mpn_s
-        if mpn_clean and not is_valid_mpn_from_field(mpn_clean, rs_pn):
-            for tok in re.split(r"[\s,;/]+", mpn_clean):
-                if heuristic_mpn_candidate(tok, rs_pn):
-                    mpn_clean = tok; break
-            else:
-                mpn_clean = ""
-        return mpn_clean or "", brand_s or "", product_link, f"OK(search:{status})"
+    if product_link == direct_url and r.status_code == 200:
+        return "", "", product_link, "PRODUCT_PAGE_FIELDS_MISSING"
     try:
         r2 = safe_get(product_link)
     except Exception as e:
@@ -335,11 +666,20 @@ def fetch_rs_info(rs_pn):
         save_failed_html(rs_pn, r2.text, suffix="product_http_"+str(r2.status_code))
         return "", "", product_link, f"PRODUCT_HTTP_{r2.status_code}"
     mpn2, brand2 = parse_product_page_for_fields(r2.text, rs_pn_hint=rs_pn)
-    if (mpn2 and (is_valid_mpn_from_field(mpn2, rs_pn) or heuristic_mpn_candidate(mpn2, rs_pn))) or (brand2 and looks_like_brand(brand2)):
+    if (mpn2 and (is_valid_mpn_from_field(mpn2, rs_pn_lower) or heuristic_mpn_candidate(mpn2, rs_pn_lower))) or (brand2 and looks_like_brand(brand2)):
         return mpn2 or "", brand2 or "", product_link, "OK(search->product)"
     save_failed_html(rs_pn, r2.text, suffix="product_fields_missing_after_search")
     return "", "", product_link, "PRODUCT_PAGE_FIELDS_MISSING"
 
+# -------- worker (runs in the thread pool) ----------
+def lookup_part(rs_pn):
+    try:
+        mpn, brand, product_url, status = fetch_rs_info(rs_pn)
+    except Exception as e:
+        mpn = brand = product_url = ""
+        status = f"EXCEPTION:{e}"
+    return mpn, brand, product_url, status
+
 # -------- input file discovery (NEW minimal change) ----------
 def find_input_csv():
     # 1) check CWD for input.csv
@@ -358,19 +698,41 @@ def find_input_csv():
         return bundled
     return None
 
-# -------- resume helper (unchanged) ----------
+# -------- resume helper ----------
 def load_already_done(output_file):
     done = set()
     if os.path.exists(output_file):
         try:
-            import pandas as _pd
-            df_done = _pd.read_csv(output_file, dtype=str)
-            if "RS_PN" in df_done.columns:
-                done = set(df_done["RS_PN"].astype(str).str.strip().tolist())
+            # utf-8-sig: output.csv re-saved from Excel gains a BOM
+            with open(output_file, newline='', encoding="utf-8-sig") as f:
+                reader = csv.DictReader(f)
+                done = {row["RS_PN"].strip() for row in reader if row.get("RS_PN")}
         except Exception:
             pass
     return done
 
+# -------- result cache (persists successful lookups across runs) ----------
+def load_result_cache(cache_file):
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    # entries are [mpn, brand, product_url, status]; drop hand-edited or
+    # old-format ones instead of failing when the rows are written
+    return {k: v for k, v in data.items() if isinstance(v, list) and len(v) == 4}
+
+def save_result_cache(cache_file, cache):
+    try:
+        tmp = cache_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp, cache_file)
+    except OSError as e:
+        print(f"Unable to save result cache {cache_file}: {e}")
+
 # -------- main entry (uses find_input_csv) ----------
 def main():
     input_file = find_input_csv()
@@ -378,35 +740,71 @@ def main():
         print("ERROR: No input.csv found. Place input.csv next to the EXE (or in ./input/input.csv).")
         return
 
-    import pandas as pd
-    df_in = pd.read_csv(input_file, dtype=str).fillna("")
-    rs_list = [str(x).strip() for x in df_in["RS_PN"].tolist()]
+    # utf-8-sig: spreadsheet exports often start with a BOM
+    with open(input_file, newline='', encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        if "RS_PN" not in (reader.fieldnames or []):
+            print(f"ERROR: {input_file} has no RS_PN column.")
+            return
+        rs_list = [(row["RS_PN"] or "").strip() for row in reader]
+    unique = list(dict.fromkeys(rs_list))
+    if len(unique) < len(rs_list):
+        print(f"Ignoring {len(rs_list) - len(unique)} duplicate RS_PN rows.")
+    rs_list = unique
 
     already_done = load_already_done(OUTPUT_FILE)
     if already_done:
         print(f"Resuming: {len(already_done)} parts already processed (found in {OUTPUT_FILE}).")
+    result_cache = load_result_cache(CACHE_FILE)
     total = len(rs_list)
+    pending = []
+    cached = []
     for idx, rs_pn in enumerate(rs_list, start=1):
         if not rs_pn:
             continue
         if rs_pn in already_done:
             print(f"[{idx}/{total}] Skipping {rs_pn} (already done).")
             continue
-        print(f"[{idx}/{total}] Looking up {rs_pn} ...")
-        try:
-            mpn, brand, product_url, status = fetch_rs_info(rs_pn)
-        except Exception as e:
-            mpn = brand = product_url = ""
-            status = f"EXCEPTION:{e}"
-        print(f" -> {status} | MPN={mpn or 'N/A'} | Brand={brand or 'N/A'}")
-        row = {"RS_PN": rs_pn, "Manufacturer_PN": mpn, "Brand": brand, "Product_URL": product_url, "Status": status}
-        header = not os.path.exists(OUTPUT_FILE)
-        with open(OUTPUT_FILE, "a", newline='', encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=["RS_PN","Manufacturer_PN","Brand","Product_URL","Status"])
+        if rs_pn in result_cache:
+            cached.append(rs_pn)
+            continue
+        pending.append(rs_pn)
+    if cached:
+        print(f"{len(cached)} parts answered from {CACHE_FILE}.")
+    print(f"Looking up {len(pending)} parts ({CONCURRENCY} in parallel) ...")
+    header = not os.path.exists(OUTPUT_FILE)
+    try:
+        with open(OUTPUT_FILE, "a", newline='', encoding="utf-8") as f, ThreadPoolExecutor(max_workers=CONCURRENCY) as ex:
+            writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
             if header:
                 writer.writeheader()
-            writer.writerow(row)
-        time.sleep(DELAY)
+            for rs_pn in cached:
+                writer.writerow(dict(zip(OUTPUT_FIELDS, [rs_pn] + result_cache[rs_pn])))
+            futures = {ex.submit(lookup_part, rs_pn): rs_pn for rs_pn in pending}
+            try:
+                for done_count, fut in enumerate(as_completed(futures), start=1):
+                    rs_pn = futures[fut]
+                    mpn, brand, product_url, status = fut.result()
+                    print(f"[{done_count}/{len(pending)}] {rs_pn} -> {status} | MPN={mpn or 'N/A'} | Brand={brand or 'N/A'}")
+                    writer.writerow(dict(zip(OUTPUT_FIELDS, [rs_pn, mpn, brand, product_url, status])))
+                    # only successful lookups are cached; errors are retried next run
+                    if status.startswith("OK"):
+                        result_cache[rs_pn] = [mpn, brand, product_url, status]
+                    # flush periodically so an interrupted run keeps (almost) all finished rows
+                    if done_count % FLUSH_EVERY == 0:
+                        f.flush()
+            except BaseException:
+                # Ctrl+C or a crash: drop the queued lookups, otherwise leaving the
+                # with block waits for every one of them to hit the site
+                ex.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                save_result_cache(CACHE_FILE, result_cache)
+    finally:
+        # only after the executor has exited: no worker can still be using the
+        # session or queue more failed pages
+        SESSION.close()
+        _FAILED_Q.join()   # let the writer finish the queued failed pages
     print("\nDone. Results in:", OUTPUT_FILE)
     print("Failed pages (if any) saved in:", FAILED_DIR)
 
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rs_fr_lookup_v10 as rs
+
+
+def _page(records, body=""):
+    blob = {"props": {"pageProps": {"searchResults": {"products": records}}}}
+    return (
+        "<html><body>" + body
+        + '<script id="__NEXT_DATA__" type="application/json">'
+        + json.dumps(blob) + "</script></body></html>"
+    )
+
+
+CARD = (
+    '<li><a href="/web/p/batteries/1111111/">Pile bouton</a>'
+    '<a data-testid="brand-link" href="/brand"><span>Panasonic</span></a>'
+    '<dl><dd data-testid="mpn-desktop">CR2032</dd></dl></li>'
+)
+
+
+def test_full_record_is_read_from_json():
+    page = _page([
+        {"stockNumber": "7654321", "brand": {"name": "Omron"}, "mpn": "G5V-1"},
+        {"stockNumber": "111-1111", "brand": {"name": "Panasonic"},
+         "manufacturerPartNumber": "CR2032", "url": "/web/p/batteries/1111111/"},
+    ])
+    assert rs.parse_next_data_for_fields(page, "1111111") == (
+        rs.BASE_URL + "/web/p/batteries/1111111/", "Panasonic", "CR2032")
+    assert rs.parse_search_page_for_fields(page, "1111111")[3] == "OK(search-json)"
+
+
+def test_missing_blob_or_record():
+    assert rs.parse_next_data_for_fields("<html></html>", "1111111") is None
+    page = _page([{"stockNumber": "7654321", "brand": "Omron"}])
+    assert rs.parse_next_data_for_fields(page, "1111111") is None
+
+
+def test_partial_record_falls_through_to_the_card():
+    # JSON only has the brand (mpn under an unknown key): the card must still be read
+    page = _page([{"stockNumber": "1111111", "brand": "Panasonic", "partNo": "CR2032"}], body=CARD)
+    assert rs.parse_next_data_for_fields(page, "1111111") == ("", "Panasonic", "")
+    assert rs.parse_search_page_for_fields(page, "1111111") == (
+        rs.BASE_URL + "/web/p/batteries/1111111/", "Panasonic", "CR2032", "OK(search-card)")
+
+
+def test_partial_record_fills_in_what_the_card_lacks():
+    card = (
+        '<li><a href="/web/p/batteries/1111111/">Pile bouton</a>'
+        '<dl><dd data-testid="mpn-desktop">CR2032</dd></dl></li>'
+    )
+    page = _page([{"stockNumber": "1111111", "brand": "Panasonic"}], body=card)
+    assert rs.parse_search_page_for_fields(page, "1111111") == (
+        rs.BASE_URL + "/web/p/batteries/1111111/", "Panasonic", "CR2032", "OK(search-card)")
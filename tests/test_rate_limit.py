@@ -0,0 +1,41 @@
+import email.utils
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rs_fr_lookup_v10 as rs
+
+
+def test_retry_after_seconds():
+    assert rs.parse_retry_after("7", 1.0) == 7.0
+    assert rs.parse_retry_after("-5", 1.0) == 0.0
+
+
+def test_retry_after_http_date():
+    value = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 28 <= rs.parse_retry_after(value, 1.0) <= 30
+
+
+def test_retry_after_garbage_or_missing_uses_default():
+    assert rs.parse_retry_after("soon", 1.5) == 1.5
+    assert rs.parse_retry_after(None, 2.0) == 2.0
+    assert rs.parse_retry_after("inf", 1.5) == 1.5
+    assert rs.parse_retry_after("nan", 1.5) == 1.5
+
+
+def test_retry_after_is_capped():
+    assert rs.parse_retry_after("3600", 1.0) == rs.MAX_RETRY_AFTER
+    far = email.utils.formatdate(time.time() + 86400, usegmt=True)
+    assert rs.parse_retry_after(far, 1.0) == rs.MAX_RETRY_AFTER
+
+
+def test_pause_is_not_shortened_by_idle_time():
+    limiter = rs.RateLimiter(10.0, 2)
+    limiter.acquire(); limiter.acquire()
+    time.sleep(0.3)        # idle time must not be credited against the pause
+    limiter.pause(0.5)
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.5
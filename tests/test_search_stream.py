@@ -0,0 +1,51 @@
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rs_fr_lookup_v10 as rs
+
+
+def test_link_split_across_chunks():
+    chunks = [
+        b'<html><li><a href="/web/p/rel',
+        b'ays/1234567/">Relais</a>' + b"x" * rs.SNIPPET_MARGIN,
+        b"<p>rest of the page</p>",
+    ]
+    it = iter(chunks)
+    data, link = rs.read_until_part_link(it, "1234567")
+    assert link == b"/web/p/relays/1234567/"
+    assert data == chunks[0] + chunks[1]
+    # stopped as soon as the snippet was buffered: the last chunk is unread
+    assert next(it) == chunks[2]
+
+
+def test_ignores_other_parts_and_returns_whole_page_without_link():
+    chunks = [b'<a href="/web/p/relays/7654321/">x</a>', b"<p>", b"</p>"] * 3
+    data, link = rs.read_until_part_link(iter(chunks), "1234567")
+    assert link is None
+    assert data == b"".join(chunks)
+
+
+class _BrokenBody:
+    status_code = 200
+    encoding = "utf-8"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, *args, **kwargs):
+        yield b'<html><a href="/web/p/'
+        raise requests.exceptions.ChunkedEncodingError("connection reset mid-body")
+
+
+def test_body_read_error_is_reported_as_search_error(monkeypatch):
+    monkeypatch.setattr(rs, "safe_get", lambda url, **kw: _BrokenBody())
+    link, brand, mpn, status = rs.search_rs_for_part_combined("1234567")
+    assert link is None
+    assert status.startswith("SEARCH_ERROR:")
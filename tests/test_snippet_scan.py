@@ -0,0 +1,33 @@
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rs_fr_lookup_v10 as rs
+
+
+def test_dt_dd_pair_does_not_hide_own_mpn():
+    # both the <dt> and its <dd> carry the mpn testid; the next card's <dd>
+    # must not win over this card's value
+    page = (
+        b'<li><a href="/web/p/batteries/1111111/">Pile</a>'
+        b'<a data-testid="brand-link" href="/brand"><span>Panasonic</span></a>'
+        b'<dl><dt data-testid="mpn-desktop">R\xc3\xa9f. fabricant</dt>'
+        b'<dd data-testid="mpn-desktop">CR2032</dd></dl></li>'
+        b'<li><dl><dd data-testid="mpn-desktop">WRONG-99</dd></dl></li>'
+    )
+    link, brand, mpn, status = rs.aggressive_search_scan(page, "1111111", strict=True)
+    assert (brand, mpn) == ("Panasonic", "CR2032")
+    assert link == rs.BASE_URL + "/web/p/batteries/1111111/"
+
+
+def test_spanless_brand_link_keeps_mpn():
+    # the lazy brand pattern runs on to a later <span>; the mpn <dd> in
+    # between must still be found
+    page = (
+        b'<li><a href="/web/p/batteries/1111111/">Pile</a>'
+        b'<a data-testid="brand-link" href="/brand">Panasonic</a>'
+        b'<dl><dd data-testid="mpn-desktop">CR2032</dd></dl>'
+        b'<span>Stock</span></li>'
+    )
+    link, brand, mpn, status = rs.aggressive_search_scan(page, "1111111", strict=True)
+    assert mpn == "CR2032"